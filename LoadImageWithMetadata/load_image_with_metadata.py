@@ -2,24 +2,150 @@
 # Place this file in ComfyUI/custom_nodes/LoadImageWithMetadata/
 
 import os
-import numpy as np
-import torch
 import hashlib
 import json
-from PIL import Image, ImageOps, ImageSequence
+import re
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 
 import folder_paths
 import node_helpers
 
+# torch and PIL are imported inside the functions that use them, so loading this node at
+# ComfyUI startup doesn't pay for them; after the first call they come from sys.modules
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _jloads(data):
+    """Parse JSON with orjson when it is installed, otherwise with the standard library."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson is stricter than json (e.g. NaN/Infinity literals), retry with the stdlib parser
+            pass
+    return json.loads(data)
+
+# Frames are wrapped from the read-only bytes returned by Image.tobytes() and immediately cast
+# into a new float tensor, so the uint8 view is never written to
+warnings.filterwarnings("ignore", message="The given buffer is not writable",
+                        category=UserWarning, module=re.escape(__name__))
+
+def _list_png_dir(path, dir_mtimes=None):
+    """
+    List one directory without following symlinks.
+    Returns (subdirs, pngs): the subdirectory DirEntry objects and (mtime, path) for each PNG.
+    Entries that can't be inspected are skipped; OSError is raised if the directory itself can't be read.
+    If dir_mtimes is a list, (path, st_mtime_ns) is appended before listing.
+    """
+    if dir_mtimes is not None:
+        # Stat before listing so a file added mid-scan invalidates the cache next time
+        dir_mtimes.append((path, os.stat(path).st_mtime_ns))
+    subdirs, pngs = [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry)
+                elif entry.is_file(follow_symlinks=False) and entry.name.lower().endswith('.png'):
+                    # DirEntry caches the stat result, no extra syscall on repeat access
+                    pngs.append((entry.stat(follow_symlinks=False).st_mtime, entry.path))
+            except OSError:
+                continue
+    return subdirs, pngs
+
+def _find_newest_png(root, dir_mtimes=None):
+    """
+    Find the newest PNG under root using os.scandir.
+    Returns (mtime, path) for the newest file, or None if no PNG was found.
+    If dir_mtimes is a list, (directory, st_mtime_ns) is appended for every directory scanned.
+    """
+    best = None
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            subdirs, pngs = _list_png_dir(current, dir_mtimes)
+        except OSError:
+            # Skip directories we can't read (permissions, vanished mid-walk, path too long, I/O errors)
+            continue
+        stack.extend(entry.path for entry in subdirs)
+        for candidate in pngs:
+            if best is None or candidate[0] > best[0]:
+                best = candidate
+
+    return best
+
+def _scan_subdir(root):
+    """Scan one output subdirectory, returning (newest, dir_mtimes)."""
+    dir_mtimes = []
+    return _find_newest_png(root, dir_mtimes), dir_mtimes
+
+# Directory mtimes this close to the scan are not trusted: on coarse-timestamp filesystems
+# (FAT/exFAT, SMB/NFS, coarse kernel clocks) a file saved just after the scan can leave them unchanged
+_RACY_MTIME_WINDOW_NS = 2_000_000_000
+
+def _dir_mtimes_unchanged(dir_mtimes, scanned_at_ns):
+    """
+    Check that every recorded directory still has the same mtime.
+    Like git's "racily clean" check, an mtime within _RACY_MTIME_WINDOW_NS of the scan
+    (or after it) makes the result untrusted, since a later save may not have changed it.
+    """
+    racy_after_ns = scanned_at_ns - _RACY_MTIME_WINDOW_NS
+    try:
+        return all(mtime_ns < racy_after_ns and os.stat(path).st_mtime_ns == mtime_ns
+                   for path, mtime_ns in dir_mtimes)
+    except OSError:
+        return False
+
+# File extensions listed in the image_file dropdown
+_IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif', '.tiff', '.tif'})
+
+# Formats to try first, by file extension. Other formats go through Image.open's full plugin search
+_FAST_OPEN_FORMATS = {
+    '.png': ['PNG'],
+    '.jpg': ['JPEG'],
+    '.jpeg': ['JPEG'],
+}
+
+def _open_image(image_path):
+    """
+    Open an image, trying the plugin matching its extension before any others.
+    Falls back to a normal Image.open (which loads every plugin on demand) if that fails.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    formats = _FAST_OPEN_FORMATS.get(os.path.splitext(image_path)[1].lower())
+    if formats is not None:
+        try:
+            return Image.open(image_path, formats=formats)
+        except UnidentifiedImageError:
+            # Extension doesn't match the content
+            pass
+    return Image.open(image_path)
+
 class LoadImageWithMetadata:
     """
     Custom node that loads the most recently saved image and extracts its metadata.
     """
     @classmethod
     def INPUT_TYPES(s):
-        input_dir = folder_paths.get_input_directory()
-        files = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f))]
-        files = folder_paths.filter_files_content_types(files, ["image"])
+        input_dir = s._get_input_dir()
+        # DirEntry.is_file uses the file type from the directory listing, only symlinks need a stat
+        try:
+            with os.scandir(input_dir) as it:
+                files = [e.name for e in it
+                         if os.path.splitext(e.name)[1].lower() in _IMAGE_EXTENSIONS and e.is_file()]
+        except OSError:
+            # The directory may have been changed in folder_paths, look it up again next time
+            s._INPUT_DIR = None
+            raise
         
         return {
             "required": {
@@ -37,6 +163,126 @@ class LoadImageWithMetadata:
     RETURN_NAMES = ("image", "metadata")
     FUNCTION = "load_image_with_metadata"
 
+    # Shared thread pool for scanning the output directory, created on first use
+    _scan_executor = None
+
+    # Most recent PNG per output directory: {output_path: (dir_mtimes, scanned_at_ns, newest)}
+    # Adding or removing a file bumps its directory's mtime, so a cache hit only costs one stat per folder
+    _scan_cache = OrderedDict()
+    _SCAN_CACHE_SIZE = 8
+
+    # folder_paths directories, looked up on first use and cleared if they stop working
+    _INPUT_DIR = None
+    _OUTPUT_DIR = None
+
+    @classmethod
+    def _get_input_dir(cls):
+        """Return the ComfyUI input directory, caching the folder_paths lookup."""
+        if cls._INPUT_DIR is None:
+            cls._INPUT_DIR = folder_paths.get_input_directory()
+        return cls._INPUT_DIR
+
+    @classmethod
+    def _get_output_dir(cls):
+        """Return the ComfyUI output directory, caching the folder_paths lookup."""
+        if cls._OUTPUT_DIR is None:
+            cls._OUTPUT_DIR = folder_paths.get_output_directory()
+        return cls._OUTPUT_DIR
+
+    # Parsed PNG metadata: {(image_path, st_mtime_ns): metadata}
+    # The parsed 'prompt'/'workflow' objects are shared by every load of the same file;
+    # downstream nodes must not modify the metadata DICT in place
+    _metadata_cache = OrderedDict()
+    _METADATA_CACHE_SIZE = 64
+
+    # IS_CHANGED compares file mtime + size by default; set True to hash the file contents instead
+    STRICT_HASH = False
+
+    # Allocate output images in page-locked memory when CUDA is available, so the copy to the GPU
+    # downstream is faster and can run asynchronously; set False to always use pageable memory
+    PIN_MEMORY = True
+
+    # Image returned on errors, created on first use and shared by every call;
+    # downstream nodes must not modify IMAGE inputs in place
+    _ERROR_PLACEHOLDER = None
+
+    @classmethod
+    def _get_error_placeholder(cls):
+        """Return the shared error placeholder image, creating it if needed."""
+        if cls._ERROR_PLACEHOLDER is None:
+            import torch
+            cls._ERROR_PLACEHOLDER = torch.zeros((1, 3, 64, 64))
+        return cls._ERROR_PLACEHOLDER
+
+    @classmethod
+    def _get_scan_executor(cls):
+        """Return the shared directory scan executor, creating it if needed."""
+        if cls._scan_executor is None:
+            cls._scan_executor = ThreadPoolExecutor(
+                max_workers=min(32, (os.cpu_count() or 1) * 4),
+                thread_name_prefix="LoadImageWithMetadata-scan",
+            )
+        return cls._scan_executor
+
+    # Shared thread pool for converting frames of animated images, created on first use
+    _decode_executor = None
+    # Minimum frame count before frame conversion is spread over the decode pool
+    _PARALLEL_DECODE_MIN_FRAMES = 4
+
+    @classmethod
+    def _get_decode_executor(cls):
+        """Return the shared frame conversion executor, creating it if needed."""
+        if cls._decode_executor is None:
+            cls._decode_executor = ThreadPoolExecutor(
+                max_workers=min(8, os.cpu_count() or 1),
+                thread_name_prefix="LoadImageWithMetadata-decode",
+            )
+        return cls._decode_executor
+
+    def _find_most_recent_png(self, output_path):
+        """
+        Find the newest PNG in the output directory.
+        Each first-level subdirectory is scanned on the shared thread pool and the
+        per-directory results are reduced to a single (mtime, path), or None.
+        The result is reused while no directory in the tree has been modified.
+        """
+        cached = self._scan_cache.get(output_path)
+        if cached is not None and _dir_mtimes_unchanged(cached[0], cached[1]):
+            self._scan_cache.move_to_end(output_path)
+            print("[LoadImageWithMetadata] Output directory unchanged, using cached result")
+            return cached[2]
+
+        # Taken before any directory is stat'ed, so every recorded mtime is compared against it
+        scanned_at_ns = time.time_ns()
+        dir_mtimes = []
+        try:
+            subdir_entries, candidates = _list_png_dir(output_path, dir_mtimes)
+        except OSError as e:
+            print(f"[LoadImageWithMetadata] Could not scan output directory: {e}")
+            return None
+
+        # Skip hidden/system folders
+        subdirs = [entry.path for entry in subdir_entries if not entry.name.startswith('.')]
+
+        if len(subdirs) == 1:
+            results = [_scan_subdir(subdirs[0])]
+        else:
+            results = self._get_scan_executor().map(_scan_subdir, subdirs) if subdirs else []
+
+        for newest, subdir_mtimes in results:
+            candidates.append(newest)
+            dir_mtimes.extend(subdir_mtimes)
+
+        candidates = [c for c in candidates if c is not None]
+        newest = max(candidates, key=itemgetter(0)) if candidates else None
+
+        self._scan_cache[output_path] = (dir_mtimes, scanned_at_ns, newest)
+        self._scan_cache.move_to_end(output_path)
+        while len(self._scan_cache) > self._SCAN_CACHE_SIZE:
+            self._scan_cache.popitem(last=False)
+
+        return newest
+
     def load_image_with_metadata(self, source_type, image_file=None, image_input=None, metadata_input=None):
         """
         Load image with metadata from either most recent file or specified file.
@@ -46,24 +292,19 @@ class LoadImageWithMetadata:
         if source_type == "direct_input":
             # Ignore the image_input parameter and find the most recent file instead
             # This allows us to maintain compatibility with the workflow
-            output_path = folder_paths.get_output_directory()
+            output_path = self._get_output_dir()
             print(f"[LoadImageWithMetadata] Looking for most recent image in: {output_path}")
             
-            # Find all PNG files in output directory and subdirectories
-            png_files = []
-            for root, dirs, files in os.walk(output_path):
-                for file in files:
-                    if file.lower().endswith('.png'):
-                        full_path = os.path.join(root, file)
-                        png_files.append((full_path, os.path.getmtime(full_path)))
+            # Find the newest PNG file in output directory and subdirectories
+            newest = self._find_most_recent_png(output_path)
             
-            if not png_files:
+            if newest is None:
+                # The directory may have been changed in folder_paths, look it up again next time
+                type(self)._OUTPUT_DIR = None
                 print("[LoadImageWithMetadata] No PNG files found in output directory")
                 return self._create_error_output("No PNG files found in output directory")
             
-            # Sort by modification time (newest first)
-            png_files.sort(key=lambda x: x[1], reverse=True)
-            most_recent_file = png_files[0][0]
+            most_recent_file = newest[1]
             
             print(f"[LoadImageWithMetadata] Most recent PNG: {most_recent_file}")
             return self._process_image_file(most_recent_file)
@@ -79,10 +320,43 @@ class LoadImageWithMetadata:
 
     def _process_image_file(self, image_path):
         """Process an image file and extract metadata."""
+        img = None
         try:
-            # Open the image using PIL
-            img = Image.open(image_path)
+            # Open the image using PIL; the one handle serves both metadata and pixel decoding
+            img = _open_image(image_path)
+
+            # Read the metadata first, pixels are only decoded afterwards
+            metadata = self._read_metadata(img, image_path)
+
+            output_image = self._decode_pixels(img)
+            if output_image is None:
+                print(f"[LoadImageWithMetadata] Error: No valid image frames loaded from {image_path}")
+                return self._create_error_output("Failed to load image frames")
+
+            return (output_image, metadata)
             
+        except Exception as e:
+            print(f"[LoadImageWithMetadata] Error processing image: {e}")
+            import traceback
+            traceback.print_exc()
+            return self._create_error_output(f"Error processing image: {str(e)}")
+
+        finally:
+            if img is not None:
+                img.close()
+
+    def _read_metadata(self, img, image_path):
+        """
+        Extract metadata from an open image without decoding any pixel data.
+        PIL parses the header (including PNG text chunks) on open and loads pixels lazily.
+        """
+        # Parsed PNG metadata is cached per file, keyed on its modification time
+        cache_key = (image_path, os.stat(image_path).st_mtime_ns)
+        metadata = self._metadata_cache.get(cache_key)
+        if metadata is not None:
+            self._metadata_cache.move_to_end(cache_key)
+            print("[LoadImageWithMetadata] Using cached metadata for unchanged file")
+        else:
             # Get the metadata dictionary from the image
             raw_metadata = img.info or {}
             
@@ -92,60 +366,126 @@ class LoadImageWithMetadata:
             
             # Parse the raw metadata to extract workflow data
             metadata = self._parse_png_metadata(raw_metadata)
-            
-            # Process the image
-            output_images = []
-            w, h = None, None
-            excluded_formats = ['MPO']
-
-            for i in ImageSequence.Iterator(img):
-                i = ImageOps.exif_transpose(i)
-                if i.mode == 'I':
-                    i = i.point(lambda i: i * (1 / 255))
-                image_rgb = i.convert("RGB")
-
-                if len(output_images) == 0:
-                    w = image_rgb.size[0]
-                    h = image_rgb.size[1]
-
-                if image_rgb.size[0] != w or image_rgb.size[1] != h:
-                    continue
-
-                image_np = np.array(image_rgb).astype(np.float32) / 255.0
-                image_tensor = torch.from_numpy(image_np)[None,]
-                output_images.append(image_tensor)
-
-            if len(output_images) > 1 and img.format not in excluded_formats:
-                output_image = torch.cat(output_images, dim=0)
-            elif output_images:
-                output_image = output_images[0]
+
+            self._metadata_cache[cache_key] = metadata
+            while len(self._metadata_cache) > self._METADATA_CACHE_SIZE:
+                self._metadata_cache.popitem(last=False)
+
+        # Shallow copy so the keys added below don't leak into the cached entry;
+        # nested values are still the cached objects (see _metadata_cache)
+        metadata = dict(metadata)
+
+        # If no workflow metadata was found, try to find a parallel JSON file
+        if not metadata or metadata.get("info") == "No workflow metadata found":
+            metadata_path = os.path.splitext(image_path)[0] + ".json"
+            if os.path.exists(metadata_path):
+                try:
+                    with open(metadata_path, 'r') as f:
+                        metadata = json.load(f)
+                    print(f"[LoadImageWithMetadata] Loaded metadata from parallel JSON file")
+                except Exception as e:
+                    print(f"[LoadImageWithMetadata] Error loading parallel JSON: {e}")
+
+        # Add the image path to metadata for reference
+        if isinstance(metadata, dict):
+            metadata["image_path"] = image_path
+            metadata["image_filename"] = os.path.basename(image_path)
+
+        return metadata
+
+    def _decode_pixels(self, img):
+        """Decode the frames of an open image into an IMAGE tensor, or None if no frames loaded."""
+        from PIL import ImageSequence
+
+        # Common case: a single-frame image (or one without n_frames), skip the frame iterator
+        n_frames = getattr(img, 'n_frames', 1)
+        if n_frames == 1:
+            image_rgb = self._frame_to_rgb(img)
+            output_image = self._alloc_batch(1, image_rgb.size[1], image_rgb.size[0])
+            self._convert_frame_into(output_image[0], image_rgb)
+            return output_image
+
+        excluded_formats = ['MPO']
+        if img.format in excluded_formats:
+            # Only the first frame is returned for these formats
+            n_frames = 1
+
+        # Frames must be read sequentially, but the float conversion of each one can run on the pool
+        executor = None
+        if n_frames >= self._PARALLEL_DECODE_MIN_FRAMES:
+            executor = self._get_decode_executor()
+        futures = []
+
+        # The batch is sized up front and each frame is written into its slot
+        output_image = None
+        count = 0
+        w, h = None, None
+
+        for i in ImageSequence.Iterator(img):
+            image_rgb = self._frame_to_rgb(i)
+
+            if count == 0:
+                w = image_rgb.size[0]
+                h = image_rgb.size[1]
+                output_image = self._alloc_batch(n_frames, h, w)
+
+            if image_rgb.size[0] != w or image_rgb.size[1] != h:
+                continue
+
+            if executor is not None:
+                # image_rgb is a standalone copy, so it stays valid after the iterator seeks on
+                futures.append(executor.submit(self._convert_frame_into, output_image[count], image_rgb))
             else:
-                print(f"[LoadImageWithMetadata] Error: No valid image frames loaded from {image_path}")
-                return self._create_error_output("Failed to load image frames")
+                self._convert_frame_into(output_image[count], image_rgb)
+            count += 1
 
-            # If no workflow metadata was found, try to find a parallel JSON file
-            if not metadata or metadata.get("info") == "No workflow metadata found":
-                metadata_path = os.path.splitext(image_path)[0] + ".json"
-                if os.path.exists(metadata_path):
-                    try:
-                        with open(metadata_path, 'r') as f:
-                            metadata = json.load(f)
-                        print(f"[LoadImageWithMetadata] Loaded metadata from parallel JSON file")
-                    except Exception as e:
-                        print(f"[LoadImageWithMetadata] Error loading parallel JSON: {e}")
-
-            # Add the image path to metadata for reference
-            if isinstance(metadata, dict):
-                metadata["image_path"] = image_path
-                metadata["image_filename"] = os.path.basename(image_path)
+            if count == n_frames:
+                break
 
-            return (output_image, metadata)
-            
-        except Exception as e:
-            print(f"[LoadImageWithMetadata] Error processing image: {e}")
-            import traceback
-            traceback.print_exc()
-            return self._create_error_output(f"Error processing image: {str(e)}")
+        # Wait for pooled conversions, re-raising any error they hit
+        for future in futures:
+            future.result()
+
+        if count == 0:
+            return None
+        # Drop unused slots left by frames that were skipped for a size mismatch
+        return output_image if count == n_frames else output_image[:count]
+
+    def _frame_to_rgb(self, frame):
+        """Apply EXIF orientation and convert a single frame to RGB."""
+        from PIL import ImageOps
+
+        frame = ImageOps.exif_transpose(frame)
+        if frame.mode == 'I':
+            frame = frame.point(lambda i: i * (1 / 255))
+        return frame.convert("RGB")
+
+    def _alloc_batch(self, n_frames, h, w):
+        """Allocate an uninitialised (n_frames, h, w, 3) float32 IMAGE batch, pinned if enabled."""
+        import torch
+
+        shape = (n_frames, h, w, 3)
+        if self.PIN_MEMORY and torch.cuda.is_available():
+            try:
+                return torch.empty(shape, dtype=torch.float32, pin_memory=True)
+            except RuntimeError as e:
+                # Page-locking can fail (e.g. locked-memory limits), a pageable buffer still works
+                print(f"[LoadImageWithMetadata] Could not allocate pinned memory, using pageable memory: {e}")
+        return torch.empty(shape, dtype=torch.float32)
+
+    def _convert_frame_into(self, out, image_rgb):
+        """Cast an RGB frame straight into a preallocated float32 batch slot and scale it in place."""
+        out.copy_(self._rgb_to_uint8_tensor(image_rgb)).div_(255.0)
+
+    def _rgb_to_uint8_tensor(self, image_rgb):
+        """
+        Return the pixels of an RGB image as an (H, W, 3) uint8 tensor.
+        Image.tobytes() copies the frame once; torch.frombuffer then wraps that copy without another.
+        """
+        import torch
+
+        w, h = image_rgb.size
+        return torch.frombuffer(image_rgb.tobytes(), dtype=torch.uint8).view(h, w, 3)
 
     def _parse_png_metadata(self, raw_metadata):
         """
@@ -161,7 +501,7 @@ class LoadImageWithMetadata:
                     # If it's a string that looks like JSON, parse it
                     if isinstance(raw_metadata[key], str):
                         print(f"[LoadImageWithMetadata] Found '{key}' as string in PNG metadata")
-                        metadata[key] = json.loads(raw_metadata[key])
+                        metadata[key] = _jloads(raw_metadata[key])
                     else:
                         print(f"[LoadImageWithMetadata] Found '{key}' as direct object in PNG metadata")
                         metadata[key] = raw_metadata[key]
@@ -183,8 +523,7 @@ class LoadImageWithMetadata:
 
     def _create_error_output(self, error_message):
         """Create a placeholder output with error message."""
-        placeholder = torch.zeros((1, 3, 64, 64))
-        return (placeholder, {"error": error_message})
+        return (self._get_error_placeholder(), {"error": error_message})
 
     @classmethod
     def IS_CHANGED(s, source_type, image_file=None, image_input=None, metadata_input=None):
@@ -197,11 +536,19 @@ class LoadImageWithMetadata:
             return float("nan")
         elif source_type == "file" and image_file is not None:
             image_path = folder_paths.get_annotated_filepath(image_file)
-            m = hashlib.sha256()
             try:
-                with open(image_path, 'rb') as f:
-                    m.update(f.read())
-                return m.digest().hex()
+                if not s.STRICT_HASH:
+                    # Modification time + size changes whenever the file is rewritten
+                    st = os.stat(image_path)
+                    return f"{st.st_mtime_ns}:{st.st_size}"
+                # Hash in chunks rather than reading the whole file into memory
+                with open(image_path, 'rb', buffering=0) as f:
+                    if hasattr(hashlib, 'file_digest'):  # Python 3.11+
+                        return hashlib.file_digest(f, 'sha256').hexdigest()
+                    m = hashlib.sha256()
+                    for chunk in iter(lambda: f.read(1 << 16), b''):
+                        m.update(chunk)
+                    return m.hexdigest()
             except FileNotFoundError:
                 return float('nan')
         return float("nan")
@@ -4,6 +4,63 @@
 import json
 import traceback # Import traceback for better error printing
 
+try:
+    from orjson import loads as _orjson_loads
+except ImportError:
+    _orjson_loads = None
+
+def _jloads(data):
+    """json.loads, via orjson when installed (mirrors _jloads in LoadImageWithMetadata)."""
+    if _orjson_loads is not None:
+        try:
+            return _orjson_loads(data)
+        except ValueError:
+            pass
+    return json.loads(data)
+
+# --- Additional component handlers ---
+# Each handler copies the relevant inputs of one node into the ControlNet or IPAdapter info dict
+
+def _handle_load_flux_controlnet(inputs, controlnet_info, ipadapter_info):
+    controlnet_info['model_name'] = inputs.get('model_name', 'N/A')
+    controlnet_info['controlnet_path'] = inputs.get('controlnet_path', 'N/A')
+
+def _handle_apply_flux_controlnet(inputs, controlnet_info, ipadapter_info):
+    controlnet_info['strength'] = inputs.get('strength', 'N/A')
+
+def _handle_canny_edge_preprocessor(inputs, controlnet_info, ipadapter_info):
+    controlnet_info['low_threshold'] = inputs.get('low_threshold', 'N/A')
+    controlnet_info['high_threshold'] = inputs.get('high_threshold', 'N/A')
+    controlnet_info['resolution'] = inputs.get('resolution', 'N/A')
+
+def _handle_load_flux_ipadapter(inputs, controlnet_info, ipadapter_info):
+    ipadapter_info['adapter'] = inputs.get('ipadatper', 'N/A')
+    ipadapter_info['clip_vision'] = inputs.get('clip_vision', 'N/A')
+    ipadapter_info['provider'] = inputs.get('provider', 'N/A')
+
+def _handle_apply_flux_ipadapter(inputs, controlnet_info, ipadapter_info):
+    ipadapter_info['ip_scale'] = inputs.get('ip_scale', 'N/A')
+
+_COMPONENT_HANDLERS = {
+    "LoadFluxControlNet": _handle_load_flux_controlnet,
+    "ApplyFluxControlNet": _handle_apply_flux_controlnet,
+    "CannyEdgePreprocessor": _handle_canny_edge_preprocessor,
+    "LoadFluxIPAdapter": _handle_load_flux_ipadapter,
+    "ApplyFluxIPAdapter": _handle_apply_flux_ipadapter,
+}
+
+# Every class_type read by the report; other nodes are dropped when the class index is built
+_TARGET_CLASSES = frozenset({
+    "CheckpointLoaderSimple",
+    "Power Lora Loader (rgthree)",
+    "CascadeResolutions",
+    "ImageScale",
+    "CLIPTextEncodeFlux",
+    "KSampler",
+    "XlabsSampler",
+    "Seed Everywhere",
+}) | frozenset(_COMPONENT_HANDLERS)
+
 class FinalMetadataReporter:
     @classmethod
     def INPUT_TYPES(cls):
@@ -99,7 +156,7 @@ class FinalMetadataReporter:
                     return metadata_dict['prompt']
                 elif isinstance(metadata_dict['prompt'], str):
                     try:
-                        return json.loads(metadata_dict['prompt'])
+                        return _jloads(metadata_dict['prompt'])
                     except json.JSONDecodeError as e:
                         print(f"[FinalMetadataReporter V7.1] Failed to parse prompt JSON: {e}")
                         
@@ -111,7 +168,7 @@ class FinalMetadataReporter:
                     return metadata_dict['workflow']
                 elif isinstance(metadata_dict['workflow'], str):
                     try:
-                        workflow_data = json.loads(metadata_dict['workflow'])
+                        workflow_data = _jloads(metadata_dict['workflow'])
                         if isinstance(workflow_data, dict):
                             if 'nodes' in workflow_data:
                                 return workflow_data['nodes']
@@ -134,24 +191,27 @@ class FinalMetadataReporter:
         output_lines = ["--- Workflow Metadata Report ---"]
         
         try:
+            # Group nodes by class_type once so each extractor only visits the nodes it needs
+            nodes_by_class = self._index_by_class(nodes_dict)
+
             # 1. Find model checkpoint
-            model_name = self._extract_model_name(nodes_dict)
+            model_name = self._extract_model_name(nodes_by_class)
             output_lines.append(f"Model: {model_name}")
             
             # 2. Find LoRA information
-            loras = self._extract_loras(nodes_dict)
+            loras = self._extract_loras(nodes_by_class)
             if loras:
                 output_lines.append("LoRAs:")
                 for lora in loras:
                     output_lines.append(f"  - {lora['name']} (Model: {lora['strength']}, CLIP: {lora['strength']})")
                     
             # 3. Find resolution
-            resolution = self._extract_resolution(nodes_dict)
+            resolution = self._extract_resolution(nodes_by_class)
             if resolution:
                 output_lines.append(f"Resolution: {resolution}")
                         
             # 4. Find positive prompt
-            pos_prompt, t5xxl_prompt = self._extract_prompts(nodes_dict)
+            pos_prompt, t5xxl_prompt = self._extract_prompts(nodes_by_class)
             output_lines.append(f"\nPositive Prompt:\n  {pos_prompt}")
             
             if t5xxl_prompt:
@@ -161,7 +221,7 @@ class FinalMetadataReporter:
             output_lines.append("\nNegative Prompt:\n  (Empty)")
             
             # 6. Find Sampler info
-            sampler_info = self._extract_sampler_info(nodes_dict)
+            sampler_info = self._extract_sampler_info(nodes_by_class, nodes_dict)
             if sampler_info:
                 output_lines.append("\n--- Sampler Details ---")
                 for key, value in sampler_info.items():
@@ -170,7 +230,7 @@ class FinalMetadataReporter:
                     output_lines.append(f"{display_key}: {value}")
             
             # 7. Find additional components like ControlNet and IPAdapter
-            additional_components = self._extract_additional_components(nodes_dict)
+            additional_components = self._extract_additional_components(nodes_by_class)
             for component_name, component_info in additional_components.items():
                 if component_info:
                     output_lines.append(f"\n--- {component_name} ---")
@@ -186,152 +246,140 @@ class FinalMetadataReporter:
             
         return "\n".join(output_lines)
 
-    def _extract_model_name(self, nodes_dict):
-        """Extract model checkpoint name."""
+    def _index_by_class(self, nodes_dict):
+        """
+        Group nodes by class_type in a single pass: {class_type: [(node_id, node), ...]}.
+        Only classes some extractor handles are kept.
+        """
+        nodes_by_class = {}
         for node_id, node in nodes_dict.items():
-            if isinstance(node, dict) and node.get('class_type') == "CheckpointLoaderSimple":
-                if 'inputs' in node and 'ckpt_name' in node['inputs']:
-                    return node['inputs']['ckpt_name']
+            # Parsed workflow JSON only contains plain dicts
+            class_type = node.get('class_type') if type(node) is dict else None
+            # The str check comes first: malformed metadata can carry unhashable class types
+            if not isinstance(class_type, str) or class_type not in _TARGET_CLASSES:
+                continue
+            nodes_by_class.setdefault(class_type, []).append((node_id, node))
+        return nodes_by_class
+
+    def _extract_model_name(self, nodes_by_class):
+        """Extract model checkpoint name."""
+        for node_id, node in nodes_by_class.get("CheckpointLoaderSimple", ()):
+            if 'inputs' in node and 'ckpt_name' in node['inputs']:
+                return node['inputs']['ckpt_name']
         return "N/A"
         
-    def _extract_loras(self, nodes_dict):
+    def _extract_loras(self, nodes_by_class):
         """Extract LoRA information."""
         loras = []
-        for node_id, node in nodes_dict.items():
-            if isinstance(node, dict) and node.get('class_type') == "Power Lora Loader (rgthree)":
-                inputs = node.get('inputs', {})
-                for key, value in inputs.items():
-                    if key.startswith('lora_') and isinstance(value, dict) and value.get('on', False):
-                        loras.append({
-                            'name': value.get('lora', 'N/A'),
-                            'strength': value.get('strength', 'N/A')
-                        })
-                break  # Found the LoRA node
+        for node_id, node in nodes_by_class.get("Power Lora Loader (rgthree)", ()):
+            inputs = node.get('inputs', {})
+            for key, value in inputs.items():
+                if key.startswith('lora_') and isinstance(value, dict) and value.get('on', False):
+                    loras.append({
+                        'name': value.get('lora', 'N/A'),
+                        'strength': value.get('strength', 'N/A')
+                    })
+            break  # Found the LoRA node
         return loras
         
-    def _extract_resolution(self, nodes_dict):
+    def _extract_resolution(self, nodes_by_class):
         """Extract resolution information."""
         # Try CascadeResolutions first
-        for node_id, node in nodes_dict.items():
-            if isinstance(node, dict) and node.get('class_type') == "CascadeResolutions":
-                if 'inputs' in node and 'size_selected' in node['inputs']:
-                    return node['inputs']['size_selected']
+        for node_id, node in nodes_by_class.get("CascadeResolutions", ()):
+            if 'inputs' in node and 'size_selected' in node['inputs']:
+                return node['inputs']['size_selected']
                     
         # Try ImageScale node as alternative
-        for node_id, node in nodes_dict.items():
-            if isinstance(node, dict) and node.get('class_type') == "ImageScale":
-                inputs = node.get('inputs', {})
-                width = inputs.get('width')
-                height = inputs.get('height')
-                if width and height:
-                    return f"{width}x{height}"
+        for node_id, node in nodes_by_class.get("ImageScale", ()):
+            inputs = node.get('inputs', {})
+            width = inputs.get('width')
+            height = inputs.get('height')
+            if width and height:
+                return f"{width}x{height}"
                     
         return None
         
-    def _extract_prompts(self, nodes_dict):
+    def _extract_prompts(self, nodes_by_class):
         """Extract positive and t5xxl prompts."""
         pos_prompt = "N/A"
         t5xxl_prompt = None
         
         # Find all CLIPTextEncodeFlux nodes
-        for node_id, node in nodes_dict.items():
-            if isinstance(node, dict) and node.get('class_type') == "CLIPTextEncodeFlux":
-                inputs = node.get('inputs', {})
-                # Skip empty prompts (likely negative)
-                if inputs.get('clip_l') == "":
-                    continue
-                    
-                if 'clip_l' in inputs:
-                    pos_prompt = inputs['clip_l']
-                    if 't5xxl' in inputs:
-                        t5xxl_prompt = inputs['t5xxl']
-                    break  # Found non-empty prompt
+        for node_id, node in nodes_by_class.get("CLIPTextEncodeFlux", ()):
+            inputs = node.get('inputs', {})
+            # Skip empty prompts (likely negative)
+            if inputs.get('clip_l') == "":
+                continue
+                
+            if 'clip_l' in inputs:
+                pos_prompt = inputs['clip_l']
+                if 't5xxl' in inputs:
+                    t5xxl_prompt = inputs['t5xxl']
+                break  # Found non-empty prompt
                     
         return pos_prompt, t5xxl_prompt
         
-    def _extract_sampler_info(self, nodes_dict):
+    def _extract_sampler_info(self, nodes_by_class, nodes_dict):
         """Extract sampler parameters from KSampler or XlabsSampler."""
         sampler_info = {}
         
         # Check for KSampler
-        for node_id, node in nodes_dict.items():
-            if isinstance(node, dict) and node.get('class_type') == "KSampler":
-                inputs = node.get('inputs', {})
-                
-                # Get seed from Seed Everywhere node if needed
-                seed_value = "N/A"
-                seed_link = inputs.get('seed')
-                if isinstance(seed_link, list) and len(seed_link) >= 1:
-                    seed_node_id = seed_link[0]
-                    seed_node = nodes_dict.get(seed_node_id)
-                    if seed_node and seed_node.get('class_type') == "Seed Everywhere":
-                        seed_value = seed_node.get('inputs', {}).get('seed', 'N/A')
-                else:
-                    # Direct seed value
-                    seed_value = inputs.get('seed', 'N/A')
-                
-                sampler_info['seed'] = seed_value
-                sampler_info['steps'] = inputs.get('steps', 'N/A')
-                sampler_info['cfg'] = inputs.get('cfg', 'N/A')
-                sampler_info['sampler_name'] = inputs.get('sampler_name', 'N/A')
-                sampler_info['scheduler'] = inputs.get('scheduler', 'N/A')
-                sampler_info['denoise'] = inputs.get('denoise', 'N/A')
-                return sampler_info  # Found KSampler
+        for node_id, node in nodes_by_class.get("KSampler", ()):
+            inputs = node.get('inputs', {})
+            
+            # Get seed from Seed Everywhere node if needed
+            seed_value = "N/A"
+            seed_link = inputs.get('seed')
+            if isinstance(seed_link, list) and len(seed_link) >= 1:
+                seed_node_id = seed_link[0]
+                seed_node = nodes_dict.get(seed_node_id)
+                if seed_node and seed_node.get('class_type') == "Seed Everywhere":
+                    seed_value = seed_node.get('inputs', {}).get('seed', 'N/A')
+            else:
+                # Direct seed value
+                seed_value = inputs.get('seed', 'N/A')
+            
+            sampler_info['seed'] = seed_value
+            sampler_info['steps'] = inputs.get('steps', 'N/A')
+            sampler_info['cfg'] = inputs.get('cfg', 'N/A')
+            sampler_info['sampler_name'] = inputs.get('sampler_name', 'N/A')
+            sampler_info['scheduler'] = inputs.get('scheduler', 'N/A')
+            sampler_info['denoise'] = inputs.get('denoise', 'N/A')
+            return sampler_info  # Found KSampler
         
         # Check for XlabsSampler
-        for node_id, node in nodes_dict.items():
-            if isinstance(node, dict) and node.get('class_type') == "XlabsSampler":
-                inputs = node.get('inputs', {})
-                
-                # XlabsSampler has slightly different parameters
-                sampler_info['seed'] = inputs.get('noise_seed', 'N/A')
-                sampler_info['steps'] = inputs.get('steps', 'N/A')
-                sampler_info['true_gs'] = inputs.get('true_gs', 'N/A')  # Similar to cfg
-                sampler_info['timestep_to_start_cfg'] = inputs.get('timestep_to_start_cfg', 'N/A')
-                sampler_info['image_to_image_strength'] = inputs.get('image_to_image_strength', 'N/A')
-                sampler_info['denoise'] = inputs.get('denoise_strength', 'N/A')
-                return sampler_info  # Found XlabsSampler
+        for node_id, node in nodes_by_class.get("XlabsSampler", ()):
+            inputs = node.get('inputs', {})
+            
+            # XlabsSampler has slightly different parameters
+            sampler_info['seed'] = inputs.get('noise_seed', 'N/A')
+            sampler_info['steps'] = inputs.get('steps', 'N/A')
+            sampler_info['true_gs'] = inputs.get('true_gs', 'N/A')  # Similar to cfg
+            sampler_info['timestep_to_start_cfg'] = inputs.get('timestep_to_start_cfg', 'N/A')
+            sampler_info['image_to_image_strength'] = inputs.get('image_to_image_strength', 'N/A')
+            sampler_info['denoise'] = inputs.get('denoise_strength', 'N/A')
+            return sampler_info  # Found XlabsSampler
                 
         return None  # No sampler found
         
-    def _extract_additional_components(self, nodes_dict):
+    def _extract_additional_components(self, nodes_by_class):
         """Extract information about additional components like ControlNet and IPAdapter."""
         components = {}
         
-        # Extract ControlNet information
+        # Extract ControlNet and IPAdapter information in one pass
+        # Classes are visited in order of first appearance, so fields keep the workflow's ordering
         controlnet_info = {}
-        for node_id, node in nodes_dict.items():
-            if isinstance(node, dict) and node.get('class_type') == "LoadFluxControlNet":
-                inputs = node.get('inputs', {})
-                controlnet_info['model_name'] = inputs.get('model_name', 'N/A')
-                controlnet_info['controlnet_path'] = inputs.get('controlnet_path', 'N/A')
-                
-            elif isinstance(node, dict) and node.get('class_type') == "ApplyFluxControlNet":
-                inputs = node.get('inputs', {})
-                controlnet_info['strength'] = inputs.get('strength', 'N/A')
-                
-            elif isinstance(node, dict) and node.get('class_type') == "CannyEdgePreprocessor":
-                inputs = node.get('inputs', {})
-                controlnet_info['low_threshold'] = inputs.get('low_threshold', 'N/A')
-                controlnet_info['high_threshold'] = inputs.get('high_threshold', 'N/A')
-                controlnet_info['resolution'] = inputs.get('resolution', 'N/A')
+        ipadapter_info = {}
+        for class_type, nodes in nodes_by_class.items():
+            handler = _COMPONENT_HANDLERS.get(class_type)
+            if handler is None:
+                continue
+            for node_id, node in nodes:
+                handler(node.get('inputs', {}), controlnet_info, ipadapter_info)
                 
         if controlnet_info:
             components['ControlNet Details'] = controlnet_info
             
-        # Extract IPAdapter information
-        ipadapter_info = {}
-        for node_id, node in nodes_dict.items():
-            if isinstance(node, dict) and node.get('class_type') == "LoadFluxIPAdapter":
-                inputs = node.get('inputs', {})
-                ipadapter_info['adapter'] = inputs.get('ipadatper', 'N/A')
-                ipadapter_info['clip_vision'] = inputs.get('clip_vision', 'N/A')
-                ipadapter_info['provider'] = inputs.get('provider', 'N/A')
-                
-            elif isinstance(node, dict) and node.get('class_type') == "ApplyFluxIPAdapter":
-                inputs = node.get('inputs', {})
-                ipadapter_info['ip_scale'] = inputs.get('ip_scale', 'N/A')
-                
         if ipadapter_info:
             components['IPAdapter Details'] = ipadapter_info
             